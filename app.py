@@ -1,11 +1,28 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+import pyarrow as pa
+import datetime
+import hashlib
+import io
 import json
+import os
+import tempfile
 from pathlib import Path
+from streamlit.runtime.uploaded_file_manager import UploadedFile
 
 from profiler.profiler import DataProfiler
 from rules.rule_engine import RuleEngine
+from utils.helpers import (
+    apply_frame_patch, diff_frames, downcast_dtypes, first_k_unique, query_mask
+)
+
+# Copy-on-Write lets raw/clean frames share memory until one is modified
+# (always on from pandas 3.0, where the option is deprecated)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
 # Page Config
 st.set_page_config(
@@ -16,25 +33,209 @@ st.set_page_config(
 st.title("Universal Data Cleaner & EDA Tool")
 
 # Performance Helpers
-@st.cache_data(show_spinner=False)
-def load_data(file):
+def upload_key(file):
+    return (file.file_id, file.name, file.size)
+
+
+@st.cache_data(show_spinner=False, hash_funcs={UploadedFile: upload_key})
+def upload_digest(file):
+    """Content hash of an upload; stable across sessions and restarts"""
+    return hashlib.sha256(file.getvalue()).hexdigest()
+
+
+ARROW_CACHE_DIR = Path(tempfile.gettempdir()) / "universal_data_cleaner"
+ARROW_CACHE_MAX_FILES = 20
+
+
+def read_upload(file):
+    file.seek(0)
     if file.name.endswith(".csv"):
-        return pd.read_csv(file)
+        # Multi-threaded Arrow parser; the C parser covers files it rejects
+        try:
+            df = pd.read_csv(file, engine="pyarrow")
+        except ValueError:
+            df = None
+        if df is None or df.columns.duplicated().any():
+            # The C parser also renames repeated headers (`score`, `score.1`)
+            file.seek(0)
+            df = pd.read_csv(file)
+        else:
+            # Arrow infers date32 columns, which arrive as datetime.date objects
+            for col in df.columns:
+                if df[col].dtype != object:
+                    continue
+                first = df[col].first_valid_index()
+                if first is not None and type(df[col][first]) is datetime.date:
+                    df[col] = pd.to_datetime(df[col])
     elif file.name.endswith(".xlsx"):
-        return pd.read_excel(file)
+        df = pd.read_excel(file)
     else:
-        return pd.read_json(file, orient="records")
+        df = pd.read_json(file, orient="records")
+    return downcast_dtypes(df)
+
+
+def prune_arrow_cache():
+    """Keep only the most recently used IPC files in the cache directory"""
+    def last_used(path):
+        try:
+            return path.stat().st_mtime
+        except OSError:
+            return 0.0
+
+    files = sorted(ARROW_CACHE_DIR.glob("*.arrow"), key=last_used, reverse=True)
+    for path in files[ARROW_CACHE_MAX_FILES:]:
+        try:
+            path.unlink()
+        except OSError:
+            # Already removed by another session, or still mapped on Windows
+            pass
+
+
+@st.cache_resource(show_spinner=False, hash_funcs={UploadedFile: upload_key})
+def upload_arrow_path(file):
+    """Parse an upload once into an Arrow IPC file named by its content hash"""
+    path = ARROW_CACHE_DIR / f"{upload_digest(file)}{Path(file.name).suffix}.arrow"
+    if path.exists():
+        try:
+            os.utime(path)
+            return str(path)
+        except OSError:
+            pass
+
+    df = read_upload(file)
+    # Arrow stores labels as strings, so e.g. Excel year headers would change type
+    if not all(isinstance(c, str) for c in df.columns):
+        return None
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowException, ValueError):
+        # Mixed-type object columns have no Arrow equivalent, and pandas itself
+        # rejects frames such as ones with duplicate labels
+        return None
+
+    # Unique temp file per writer: sessions are threads sharing one process
+    ARROW_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=ARROW_CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    prune_arrow_cache()
+    return str(path)
+
+
+@st.cache_data(show_spinner=False, hash_funcs={UploadedFile: upload_key})
+def load_data_in_memory(file):
+    return read_upload(file)
+
+
+def load_data(file):
+    path = upload_arrow_path(file)
+    if path is not None:
+        try:
+            # Memory-mapped read: numeric columns without nulls share the mapped pages
+            table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+            return table.to_pandas(split_blocks=True)
+        except OSError:
+            # Pruned from the cache directory since this session cached its path
+            pass
+    return load_data_in_memory(file)
 
 
 @st.cache_data(show_spinner=False)
-def run_profiling(df):
-    profiler = DataProfiler(df)
+def run_profiling(_df, _na_mask, upload_hash):
+    # Frames are not hashed; the upload's content hash identifies the data
+    profiler = DataProfiler(_df, _na_mask)
     return profiler.profile()
 
 
+@st.cache_data(show_spinner=False, max_entries=20)
+def run_query(query_text, df_key):
+    # df_key identifies the upload + cleaning run; the frame is only built on a miss
+    df = get_active_df()
+    return df[query_mask(df, query_text)]
+
+
+# Script globals are fresh on every rerun, so this holds one rebuilt frame per run
+_active_df_memo = {}
+
+
 def get_active_df():
     """Always return the active dataframe (cleaned if exists, else raw)"""
-    return st.session_state.get("clean_df", st.session_state["raw_df"])
+    key = get_active_df_key()
+    if _active_df_memo.get("key") != key:
+        raw = st.session_state["raw_df"]
+        patch = st.session_state.get("cleaning_patch")
+        _active_df_memo["key"] = key
+        _active_df_memo["df"] = raw if patch is None else apply_frame_patch(raw, patch)
+    return _active_df_memo["df"]
+
+
+def get_active_df_key():
+    return (st.session_state["file_id"], st.session_state.get("clean_version", 0))
+
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """Write pandas CSV output straight into a byte buffer (no str copy)"""
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, encoding="utf-8")
+    return buf.getvalue()
+
+
+# Above this many values, charts are aggregated server-side instead of shipping every row
+PLOT_ROW_LIMIT = 200_000
+
+
+def finite_values(series: pd.Series) -> np.ndarray:
+    # np.histogram/quantile fail or skew on inf, which CSV parsers accept
+    values = series.to_numpy(dtype="float64", na_value=np.nan)
+    return values[np.isfinite(values)]
+
+
+def binned_histogram(series: pd.Series, bins: int = 80):
+    values = finite_values(series)
+    counts, edges = np.histogram(values, bins=bins)
+    fig = go.Figure(go.Bar(
+        x=0.5 * (edges[:-1] + edges[1:]),
+        y=counts,
+        width=np.diff(edges)
+    ))
+    fig.update_layout(bargap=0, xaxis_title=series.name, yaxis_title="count")
+    return fig
+
+
+def summary_box(series: pd.Series):
+    values = finite_values(series)
+    if values.size == 0:
+        return go.Figure()
+
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    lower = q1 - 1.5 * iqr
+    upper = q3 + 1.5 * iqr
+    fig = go.Figure(go.Box(
+        name=series.name,
+        q1=[q1],
+        median=[median],
+        q3=[q3],
+        lowerfence=[values[values >= lower].min()],
+        upperfence=[values[values <= upper].max()]
+    ))
+    fig.update_layout(yaxis_title=series.name)
+    return fig
+
+
+COLS_PAGE_SIZE = 25
+
+
+def show_more_columns(counter):
+    st.session_state[counter] += COLS_PAGE_SIZE
 
 
 # File Upload
@@ -48,9 +249,17 @@ if not uploaded_file:
 
 df = load_data(uploaded_file)
 
-# Persist raw + active dataframe
+# One null-mask pass shared by every missing-value stat below
+na = df.isna()
+missing_count = na.sum(axis=0)
+
+# Persist raw dataframe; cleaning is kept as a patch against it
+if st.session_state.get("file_id") != uploaded_file.file_id:
+    st.session_state["file_id"] = uploaded_file.file_id
+    st.session_state.pop("cleaning_patch", None)
+    st.session_state["overview_cols_shown"] = COLS_PAGE_SIZE
+    st.session_state["cleaning_cols_shown"] = COLS_PAGE_SIZE
 st.session_state["raw_df"] = df
-st.session_state.setdefault("clean_df", df.copy())
 
 st.success("Dataset loaded successfully")
 
@@ -66,7 +275,8 @@ with tab_overview:
     c1, c2, c3 = st.columns(3)
     c1.metric("Rows", df.shape[0])
     c2.metric("Columns", df.shape[1])
-    c3.metric("Total Missing", int(df.isna().sum().sum()))
+    # Sums the per-column counts (one value per column), not the N x M mask again
+    c3.metric("Total Missing", int(missing_count.sum()))
 
     st.dataframe(df.head(20), use_container_width=True)
 
@@ -75,8 +285,8 @@ with tab_overview:
 
     missing_df = pd.DataFrame({
         "Column": df.columns,
-        "Missing Count": df.isna().sum(),
-        "Missing %": (df.isna().mean() * 100).round(2)
+        "Missing Count": missing_count,
+        "Missing %": (missing_count / len(df) * 100).round(2)
     }).reset_index(drop=True)
 
     st.dataframe(
@@ -87,25 +297,36 @@ with tab_overview:
     # ---------------- Table Definition ----------------
     st.subheader("Table Definition (Data Dictionary)")
 
+    # Per-column stats are only built for this window of columns
+    visible_cols = df.columns[:st.session_state["overview_cols_shown"]]
     table_def = []
-    for col in df.columns:
-        sample_vals = df[col].dropna().unique()[:3]
+    for col in visible_cols:
+        sample_vals = first_k_unique(df[col])
         sample_vals = ", ".join(map(str, sample_vals))
 
         table_def.append({
             "Column Name": col,
             "Data Type": str(df[col].dtype),
-            "Non-Null Count": int(df[col].notna().sum()),
-            "Missing Count": int(df[col].isna().sum()),
+            "Non-Null Count": len(df) - int(missing_count[col]),
+            "Missing Count": int(missing_count[col]),
             "Unique Values": int(df[col].nunique()),
             "Sample Values": sample_vals
         })
 
     st.dataframe(pd.DataFrame(table_def), use_container_width=True)
 
+    if len(visible_cols) < df.shape[1]:
+        st.caption(f"Showing {len(visible_cols)} of {df.shape[1]} columns")
+        st.button(
+            "Show more",
+            key="more_cols_overview",
+            on_click=show_more_columns,
+            args=("overview_cols_shown",)
+        )
+
 # TAB 2 — CLEANING
 with tab_cleaning:
-    profile = run_profiling(df)
+    profile = run_profiling(df, na, upload_digest(uploaded_file))
 
     st.header("🤖 Auto Rule Suggestions")
 
@@ -152,7 +373,8 @@ with tab_cleaning:
         "columns": {}
     }
 
-    for col in df.columns:
+    visible_cols = df.columns[:st.session_state["cleaning_cols_shown"]]
+    for col in visible_cols:
         with st.expander(f"⚙️ {col}"):
             rule = {}
 
@@ -182,10 +404,20 @@ with tab_cleaning:
             if rule:
                 rules["columns"][col] = rule
 
+    if len(visible_cols) < df.shape[1]:
+        st.caption(f"Showing {len(visible_cols)} of {df.shape[1]} columns")
+        st.button(
+            "Show more",
+            key="more_cols_cleaning",
+            on_click=show_more_columns,
+            args=("cleaning_cols_shown",)
+        )
+
     if st.button("Apply Cleaning"):
         engine = RuleEngine(df, rules)
         clean_df, audit = engine.apply()
-        st.session_state["clean_df"] = clean_df
+        st.session_state["cleaning_patch"] = diff_frames(df, clean_df)
+        st.session_state["clean_version"] = st.session_state.get("clean_version", 0) + 1
 
         st.success("Cleaning completed")
 
@@ -207,20 +439,23 @@ with tab_eda:
     else:
         col = st.selectbox("Select numeric column", num_cols)
 
-        st.plotly_chart(
-            px.histogram(active_df, x=col, marginal="box"),
-            use_container_width=True
-        )
+        if active_df[col].count() > PLOT_ROW_LIMIT:
+            hist_fig = binned_histogram(active_df[col])
+            box_fig = summary_box(active_df[col])
+        else:
+            hist_fig = px.histogram(active_df, x=col, marginal="box")
+            box_fig = px.box(active_df, y=col)
 
-        st.plotly_chart(
-            px.box(active_df, y=col),
-            use_container_width=True
-        )
+        st.plotly_chart(hist_fig, use_container_width=True)
+        st.plotly_chart(box_fig, use_container_width=True)
 
         if len(num_cols) > 1:
             st.subheader("Correlation Heatmap")
             corr = active_df[num_cols].corr()
-            fig = px.imshow(corr, text_auto=True)
+            # Per-cell labels dominate render time on wide matrices
+            fig = px.imshow(corr, text_auto=len(num_cols) <= 20)
+            if len(num_cols) > 30:
+                fig.update_traces(zsmooth=False, hoverongaps=False)
             st.plotly_chart(fig, use_container_width=True)
 
 # TAB 4 — SQL QUERY EDITOR
@@ -245,7 +480,7 @@ with tab_query:
 
     if st.button("▶ Run Query"):
         try:
-            result = get_active_df().query(query_text)
+            result = run_query(query_text, get_active_df_key())
             st.success(f"Returned {len(result)} rows")
             st.dataframe(result, use_container_width=True)
         except Exception as e:
@@ -258,8 +493,9 @@ active_df = get_active_df()
 
 st.download_button(
     "Download CSV",
-    active_df.to_csv(index=False),
-    "cleaned.csv"
+    to_csv_bytes(active_df),
+    "cleaned.csv",
+    mime="text/csv"
 )
 
 st.download_button(
@@ -1,25 +1,108 @@
+import re
+
+import numpy as np
 import pandas as pd
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+_NON_WORD = re.compile(r"[^\w_]")
+# `and` outside quoted literals and backticked names, and `col == 'text'` comparisons
+_AND_SPLIT = re.compile(r"""\s+and\s+(?=(?:[^'"`]*['"`][^'"`]*['"`])*[^'"`]*$)""")
+_STR_EQ = re.compile(r"""^\s*(`[^`]+`|\w+)\s*==\s*(['"])(.*)\2\s*$""")
+
 
 def standardize_column_names(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df.columns = (
-        df.columns
-        .str.strip()
-        .str.lower()
-        .str.replace(" ", "_")
-        .str.replace(r"[^\w_]", "", regex=True)
-    )
+    df = df.copy(deep=False)
+    df.columns = [
+        _NON_WORD.sub("", str(c).strip().lower().replace(" ", "_"))
+        for c in df.columns
+    ]
+    return df
+
+
+def downcast_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy(deep=False)
+
+    # int32 at the smallest: int8/int16 arithmetic wraps silently in queries
+    int32 = np.iinfo(np.int32)
+    for col in df.select_dtypes("integer").columns:
+        series = df[col]
+        if (
+            series.dtype.itemsize > 4
+            and not series.empty
+            and series.min() >= int32.min
+            and series.max() <= int32.max
+        ):
+            df[col] = series.astype("int32")
+
+    # Floats stay float64: imputed means/medians and correlations are computed
+    # in the column's dtype, and float32 would round them in the export
     return df
 
 
+def diff_frames(raw: pd.DataFrame, clean: pd.DataFrame) -> dict:
+    """Describe `clean` as dropped columns, changed columns and surviving rows of `raw`"""
+    if not clean.columns.is_unique:
+        # Patching is by label; standardized names can collide, so keep the frame
+        return {"frame": clean}
+
+    same_rows = clean.index.equals(raw.index)
+    modified_cols = {}
+    for col in clean.columns:
+        if col in raw.columns:
+            base = raw[col] if same_rows else raw[col].loc[clean.index]
+            if base.equals(clean[col]):
+                continue
+        # Own copy so the patch doesn't pin the cleaned frame's blocks
+        modified_cols[col] = clean[col].copy()
+
+    return {
+        "columns": list(clean.columns),
+        "drop_cols": [c for c in raw.columns if c not in clean.columns],
+        "modified_cols": modified_cols,
+        "row_index": None if same_rows else clean.index,
+    }
+
+
+def apply_frame_patch(raw: pd.DataFrame, patch: dict) -> pd.DataFrame:
+    if "frame" in patch:
+        return patch["frame"]
+    df = raw.drop(columns=patch["drop_cols"])
+    if patch["row_index"] is not None:
+        df = df.loc[patch["row_index"]]
+    for col, values in patch["modified_cols"].items():
+        df[col] = values
+    return df[patch["columns"]]
+
+
+def first_k_unique(series: pd.Series, k: int = 3) -> list:
+    # Stops as soon as k distinct values are seen instead of hashing the column
+    seen = []
+    for value in series:
+        if pd.isna(value):
+            continue
+        if value not in seen:
+            seen.append(value)
+            if len(seen) == k:
+                break
+    return seen
+
+
 def safe_to_numeric(series: pd.Series) -> pd.Series:
     return pd.to_numeric(series, errors="coerce")
 
 
 def calculate_iqr_bounds(series: pd.Series):
-    q1 = series.quantile(0.25)
-    q3 = series.quantile(0.75)
+    # Both quartiles from one partial sort; NaNs are masked out here
+    arr = series.to_numpy(dtype="float64", na_value=np.nan)
+    arr = arr[~np.isnan(arr)]
+    if arr.size == 0:
+        return np.nan, np.nan
+
+    q1, q3 = np.quantile(arr, [0.25, 0.75])
     iqr = q3 - q1
 
     lower = q1 - 1.5 * iqr
@@ -27,13 +110,80 @@ def calculate_iqr_bounds(series: pd.Series):
     return lower, upper
 
 
-def try_parse_datetime(series: pd.Series, threshold: float = 0.7) -> bool:
+def _eval_mask(df: pd.DataFrame, expr: str) -> np.ndarray:
+    result = df.eval(expr)
+    # Reject assignments (`qty = 5`) and non-boolean expressions (`qty + 1`)
+    if not isinstance(result, pd.Series) or not pd.api.types.is_bool_dtype(result.dtype):
+        raise ValueError(f"Query is not a boolean condition: {expr}")
+    return result.to_numpy(dtype=bool, na_value=False)
+
+
+def query_mask(df: pd.DataFrame, expr: str) -> np.ndarray:
+    # Grouped or or/not expressions need the full parser for precedence
+    if "(" in expr or re.search(r"\b(or|not)\b", expr):
+        return _eval_mask(df, expr)
+
+    masks = []
+    for clause in _AND_SPLIT.split(expr.strip()):
+        match = _STR_EQ.match(clause)
+        col = match.group(1).strip("`") if match else None
+        if col in df.columns:
+            # String equality compares directly instead of going through numexpr
+            masks.append(df[col].eq(match.group(3)).to_numpy(dtype=bool, na_value=False))
+        else:
+            masks.append(_eval_mask(df, clause))
+
+    return np.logical_and.reduce(masks)
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _iqr_mask(arr, lower, upper):
+        # Compare and count in one fused parallel pass
+        n = arr.size
+        out = np.empty(n, np.bool_)
+        count = 0
+        for i in prange(n):
+            m = arr[i] < lower or arr[i] > upper
+            out[i] = m
+            if m:
+                count += 1
+        return out, count
+else:
+    def _iqr_mask(arr, lower, upper):
+        out = (arr < lower) | (arr > upper)
+        return out, out.sum()
+
+
+def outlier_mask(series: pd.Series, lower: float, upper: float):
+    arr = series.to_numpy(dtype="float64", na_value=np.nan)
+    mask, count = _iqr_mask(arr, float(lower), float(upper))
+    return mask, int(count)
+
+
+def try_parse_datetime(
+    series: pd.Series,
+    threshold: float = 0.7,
+    sample_size: int = 200
+) -> bool:
+    # Probe a small sample first; most non-date columns fail here cheaply
+    sample = series.dropna().head(sample_size)
+    if sample.empty:
+        return False
+
+    parsed = pd.to_datetime(sample, errors="coerce", format="mixed")
+    if parsed.notna().mean() < threshold:
+        return False
+
+    # Full pass lets pandas infer one format instead of parsing per element
     parsed = pd.to_datetime(series, errors="coerce")
     return parsed.notna().mean() >= threshold
 
 
 def infer_column_type(series: pd.Series) -> str:
-    if try_parse_datetime(series):
+    if series.dtype.kind == "M":
+        return "datetime"
+    if series.dtype.kind == "O" and try_parse_datetime(series):
         return "datetime"
     if series.dtype.kind in "iuf":
         return "numeric"
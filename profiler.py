@@ -1,11 +1,12 @@
 import pandas as pd
 from typing import Dict, Optional
-from utils.helpers import infer_column_type, calculate_iqr_bounds
+from utils.helpers import infer_column_type, calculate_iqr_bounds, outlier_mask
 
 
 class DataProfiler:
-    def __init__(self, df: pd.DataFrame):
+    def __init__(self, df: pd.DataFrame, na_mask: Optional[pd.DataFrame] = None):
         self.df = df
+        self.na_mask = na_mask
 
     def profile(self) -> Dict:
         profile = {
@@ -13,34 +14,37 @@ class DataProfiler:
             "columns": {}
         }
 
+        # One null-mask pass for the whole frame; per-column stats derive from it
+        na_mask = self.na_mask if self.na_mask is not None else self.df.isna()
+        missing_count = na_mask.sum(axis=0)
+        missing_percent = na_mask.mean(axis=0) * 100
+
         for col in self.df.columns:
             series = self.df[col]
+            clean = series[~na_mask[col]]
+            unique_count = int(clean.nunique())
 
             profile["columns"][col] = {
                 "dtype": str(series.dtype),
                 "detected_type": infer_column_type(series),
-                "missing_count": int(series.isna().sum()),
-                "missing_percent": round(series.isna().mean() * 100, 2),
-                "unique_count": int(series.nunique(dropna=True)),
-                "sample_value": (
-                    series.dropna().iloc[0]
-                    if not series.dropna().empty
-                    else None
-                ),
-                "is_constant": series.nunique(dropna=True) == 1,
-                "outlier_info": self._outlier_info(series),
+                "missing_count": int(missing_count[col]),
+                "missing_percent": round(float(missing_percent[col]), 2),
+                "unique_count": unique_count,
+                "sample_value": clean.iloc[0] if not clean.empty else None,
+                "is_constant": unique_count == 1,
+                "outlier_info": self._outlier_info(series, clean),
             }
 
         return profile
 
-    def _outlier_info(self, series: pd.Series) -> Optional[Dict]:
+    def _outlier_info(self, series: pd.Series, clean: pd.Series) -> Optional[Dict]:
         if series.dtype.kind not in "iuf":
             return None
 
-        lower, upper = calculate_iqr_bounds(series.dropna())
+        lower, upper = calculate_iqr_bounds(clean)
 
-        outliers = series[(series < lower) | (series > upper)]
+        _, outlier_count = outlier_mask(clean, lower, upper)
         return {
-            "outlier_count": int(outliers.count()),
-            "outlier_percent": round(len(outliers) / len(series), 4) * 100
+            "outlier_count": outlier_count,
+            "outlier_percent": round(outlier_count / len(series), 4) * 100
         }
\ No newline at end of file
@@ -1,28 +1,52 @@
+import numpy as np
 import pandas as pd
+
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
 from utils.helpers import calculate_iqr_bounds, safe_to_numeric, standardize_column_names
 
 
+MODE_SAMPLE_SIZE = 50_000
+
+
 class RuleEngine:
     def __init__(self, df: pd.DataFrame, rules: dict):
-        self.df = df.copy()
+        # Shallow copy: under Copy-on-Write column data is only copied when modified
+        self.df = df.copy(deep=False)
         self.rules = rules
         self.audit_log = []
 
     def apply(self):
         self._apply_global_rules()
 
+        # Group column rules by action so each one hits the frame once
+        drop_cols = []
+        cast_types = {}
+        missing_strategies = {}
+        outlier_cols = []
+
         for col, rule in self.rules.get("columns", {}).items():
             if col not in self.df.columns:
                 continue
 
             if rule.get("drop"):
-                self.df.drop(columns=[col], inplace=True)
-                self.audit_log.append(f"Dropped column: {col}")
+                drop_cols.append(col)
                 continue
 
-            self._handle_type_cast(col, rule)
-            self._handle_missing(col, rule)
-            self._handle_outliers(col, rule)
+            if rule.get("type"):
+                cast_types[col] = rule["type"]
+            if rule.get("missing", {}).get("strategy"):
+                missing_strategies[col] = rule["missing"]
+            if rule.get("outliers"):
+                outlier_cols.append(col)
+
+        self._handle_drops(drop_cols)
+        self._handle_type_casts(cast_types)
+        self._handle_missing(missing_strategies)
+        self._handle_outliers(outlier_cols)
 
         return self.df, self.audit_log
 
@@ -36,56 +60,113 @@ class RuleEngine:
             self.df = self.df.drop_duplicates()
             self.audit_log.append(f"Dropped {before - len(self.df)} duplicate rows")
 
-    def _handle_type_cast(self, col, rule):
-        target_type = rule.get("type")
-
-        if target_type == "numeric":
-            self.df[col] = safe_to_numeric(self.df[col])
-            self.audit_log.append(f"{col}: cast to numeric")
-
-        elif target_type == "datetime":
-            self.df[col] = pd.to_datetime(self.df[col], errors="coerce")
-            self.audit_log.append(f"{col}: cast to datetime")
-
-        elif target_type == "categorical":
-            self.df[col] = self.df[col].astype("category")
-            self.audit_log.append(f"{col}: cast to categorical")
-
-    def _handle_missing(self, col, rule):
-        strategy = rule.get("missing", {}).get("strategy")
-        if not strategy:
+    def _handle_drops(self, drop_cols):
+        if not drop_cols:
             return
 
-        before = self.df[col].isna().sum()
-
-        if strategy == "mean":
-            self.df[col] = self.df[col].fillna(self.df[col].mean())
-        elif strategy == "median":
-            self.df[col] = self.df[col].fillna(self.df[col].median())
-        elif strategy == "mode":
-            self.df[col] = self.df[col].fillna(self.df[col].mode()[0])
-        elif strategy == "constant":
-            value = rule["missing"].get("value", "Unknown")
-            self.df[col] = self.df[col].fillna(value)
-        elif strategy == "drop":
-            self.df = self.df.dropna(subset=[col])
-
-        after = self.df[col].isna().sum()
-        self.audit_log.append(
-            f"{col}: missing handled ({before} → {after}) using {strategy}"
-        )
-
-    def _handle_outliers(self, col, rule):
-        outlier_rule = rule.get("outliers")
-        if not outlier_rule:
+        self.df = self.df.drop(columns=drop_cols)
+        for col in drop_cols:
+            self.audit_log.append(f"Dropped column: {col}")
+
+    def _handle_type_casts(self, cast_types):
+        numeric_cols = [c for c, t in cast_types.items() if t == "numeric"]
+        datetime_cols = [c for c, t in cast_types.items() if t == "datetime"]
+        category_cols = [c for c, t in cast_types.items() if t == "categorical"]
+
+        if numeric_cols:
+            self.df[numeric_cols] = self.df[numeric_cols].apply(safe_to_numeric)
+        if datetime_cols:
+            self.df[datetime_cols] = self.df[datetime_cols].apply(
+                pd.to_datetime, errors="coerce"
+            )
+        if category_cols:
+            self.df = self.df.astype(dict.fromkeys(category_cols, "category"))
+
+        for col, target_type in cast_types.items():
+            if target_type in ("numeric", "datetime", "categorical"):
+                self.audit_log.append(f"{col}: cast to {target_type}")
+
+    def _handle_missing(self, missing_strategies):
+        if not missing_strategies:
             return
 
-        lower, upper = calculate_iqr_bounds(self.df[col].dropna())
-
-        before = len(self.df)
-        self.df = self.df[(self.df[col] >= lower) & (self.df[col] <= upper)]
-        removed = before - len(self.df)
+        cols = list(missing_strategies)
+        before = self.df[cols].isna().sum()
+
+        by_strategy = {}
+        for col, missing_rule in missing_strategies.items():
+            by_strategy.setdefault(missing_rule["strategy"], []).append(col)
+
+        fill_values = {}
+        stat_cols = by_strategy.get("mean", []) + by_strategy.get("median", [])
+        if stat_cols:
+            stats = self.df[stat_cols].agg(["mean", "median"])
+            for strategy in ("mean", "median"):
+                for col in by_strategy.get(strategy, []):
+                    fill_values[col] = stats.at[strategy, col]
+
+        for col in by_strategy.get("mode", []):
+            fill_values[col] = self._mode_value(col)
+
+        for col in by_strategy.get("constant", []):
+            value = missing_strategies[col].get("value", "Unknown")
+            if (
+                isinstance(self.df[col].dtype, pd.CategoricalDtype)
+                and value not in self.df[col].cat.categories
+            ):
+                self.df[col] = self.df[col].cat.add_categories([value])
+            fill_values[col] = value
+
+        if fill_values:
+            self.df = self.df.fillna(fill_values)
+
+        drop_na_cols = by_strategy.get("drop", [])
+        if drop_na_cols:
+            self.df = self.df.dropna(subset=drop_na_cols)
+
+        after = self.df[cols].isna().sum()
+        for col in cols:
+            self.audit_log.append(
+                f"{col}: missing handled ({before[col]} → {after[col]}) "
+                f"using {missing_strategies[col]['strategy']}"
+            )
+
+    def _mode_value(self, col):
+        series = self.df[col].dropna()
+        if series.empty:
+            return np.nan
+
+        # Imputation only needs the most frequent value, so a sample is enough;
+        # categories are already a small frequency table and stay exact
+        if (
+            len(series) > MODE_SAMPLE_SIZE
+            and not isinstance(series.dtype, pd.CategoricalDtype)
+        ):
+            series = series.sample(MODE_SAMPLE_SIZE, random_state=0)
+        # mode() breaks ties on the smallest value, as the unsampled path always did
+        return series.mode().iloc[0]
+
+    def _handle_outliers(self, outlier_cols):
+        if not outlier_cols:
+            return
 
-        self.audit_log.append(
-            f"{col}: removed {removed} outliers using IQR"
-        )
\ No newline at end of file
+        # One in-bounds mask per column, evaluated by numexpr when available
+        masks = []
+        for col in outlier_cols:
+            lower, upper = calculate_iqr_bounds(self.df[col])
+            values = self.df[col].to_numpy(dtype="float64", na_value=np.nan)
+            if ne is not None:
+                masks.append(ne.evaluate(
+                    "(values >= lower) & (values <= upper)",
+                    local_dict={"values": values, "lower": lower, "upper": upper}
+                ))
+            else:
+                masks.append((values >= lower) & (values <= upper))
+
+        # Combine every column's bounds into one row filter
+        self.df = self.df[np.logical_and.reduce(masks)]
+
+        for col, mask in zip(outlier_cols, masks):
+            self.audit_log.append(
+                f"{col}: removed {int((~mask).sum())} outliers using IQR"
+            )
\ No newline at end of file